@@ -1,91 +1,286 @@
-from llama_index.tools.mcp import McpToolSpec, BasicMCPClient
+from llama_index.tools.mcp import McpToolSpec
 from llama_index.llms.groq import Groq
 from llama_index.core.agent.workflow import AgentWorkflow, FunctionAgent, ToolCall, ToolCallResult
-from utils import ChatHistory
+from llama_index.core.llms import ChatMessage
+from utils import SessionHistoryStore, RedisSessionHistoryStore, SafeRateLimiter, UserRateLimiter
+from cache import ResumeParseCache
+from mcp_pool import PooledMCPClient
+from batch import BatchQueue, BatchStatus
+from prerank import normalize_seniority, parse_candidate_profile
+from metrics import REGISTRY, install_llm_usage_handler, new_trace_id, register_cache, track_stage, trace_id_var
 import redis.asyncio as redis
 from contextlib import asynccontextmanager
-from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, UploadFile
 from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 from llama_cloud_services import LlamaExtract
-from auth import authenticate_user
-from fastapi.responses import ORJSONResponse
+from auth import authenticate_user, check_supabase
+from health import HealthChecks, check_http
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import AsyncIterator, List, Literal, Optional
+import asyncio
 import json
+import os
+import threading
+from math import ceil
 import gradio as gr
-import requests as rq
 
 class ApiInput(BaseModel):
     resume: str
+    session_id: Optional[str] = None
+    mode: Literal["agent", "pipeline"] = "agent"
 
 class ApiOutput(BaseModel):
     response: str
     process: str
 
-with open("/run/secrets/internal_key", "r") as f:
+class BatchSubmission(BaseModel):
+    batch_id: str
+    total: int
+
+class ApiEvent(BaseModel):
+    type: Literal["tool_call", "tool_result", "response", "error"]
+    tool_name: Optional[str] = None
+    content: str
+
+secrets_dir = os.environ.get("SECRETS_DIR", "/run/secrets")
+
+with open(f"{secrets_dir}/internal_key", "r") as f:
     internal_key = f.read()
 f.close()
 
+redis_connection = redis.from_url(os.environ.get("REDIS_URL", "redis://resume_matcher_redis:6379"), encoding="utf8")
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    redis_connection = redis.from_url("redis://resume_matcher_redis:6379", encoding="utf8")
-    await FastAPILimiter.init(redis_connection)
+    health.start()
+    await batch_queue.start()
     yield
-    await FastAPILimiter.close()
+    await health.stop()
+    await batch_queue.stop()
+    await mcp_client.aclose()
+    if FastAPILimiter.redis is not None:
+        await FastAPILimiter.close()
 
 app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id = request.headers.get("x-request-id") or new_trace_id()
+    trace_id_var.set(trace_id)
+    response = await call_next(request)
+    response.headers["x-request-id"] = trace_id
+    return response
+
 async def check_api_key(x_api_key: str = Header(None)):
     if x_api_key == internal_key:
         return x_api_key
     else:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
-with open("/run/secrets/llamacloud_key") as f:
+with open(f"{secrets_dir}/llamacloud_key") as f:
     llamacloud_api_key = f.read()
 f.close()
 
-with open("/run/secrets/groq_key") as g:
+with open(f"{secrets_dir}/groq_key") as g:
     groq_api_key = g.read()
 g.close()
 
-hist = ChatHistory()
-mcp_client = BasicMCPClient("http://resume_matcher_mcp_server:8000/sse")
+if os.environ.get("CHAT_HISTORY_BACKEND", "memory") == "redis":
+    histories = RedisSessionHistoryStore(redis_connection)
+else:
+    histories = SessionHistoryStore()
+mcp_client = PooledMCPClient(os.environ.get("MCP_SERVER_URL", "http://resume_matcher_mcp_server:8000/sse"))
 mcp_tools = McpToolSpec(mcp_client)
-llm = Groq(model="llama-3.3-70b-versatile", api_key=groq_api_key)
-extractor = LlamaExtract(api_key=llamacloud_api_key)
-extractor_agent = extractor.get_agent(name="resume-parser")
+groq_api_base = os.environ.get("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+llm: Optional[Groq] = None
+extractor_agent = None
+extractor_lock = threading.Lock()
+parse_cache = ResumeParseCache()
+user_rate_limiter = UserRateLimiter(times=10, seconds=60, redis_connection=redis_connection)
+install_llm_usage_handler()
+register_cache("resume_parser", parse_cache)
+
+def get_llm() -> Groq:
+    global llm
+    if llm is None:
+        llm = Groq(model="llama-3.3-70b-versatile", api_key=groq_api_key, api_base=groq_api_base)
+    return llm
+
+def get_extractor_agent(refresh: bool = False):
+    global extractor_agent
+    with extractor_lock:
+        if extractor_agent is None or refresh:
+            extractor_agent = LlamaExtract(api_key=llamacloud_api_key).get_agent(name="resume-parser")
+    return extractor_agent
+
+SYSTEM_PROMPT = "You are the ResumeMatcher agent. Your task is to match a resume with jobs you can find from the web, evaluate the matches and return to the user a comprehensive summary of these matches, using the available tools. You should follow this workflow:\n1. Starting from the candidate description deriving from the resume, retrieve the top matching jobs that fit the candidate profile: first look for them in the local job index with the 'job_index_search' tool (passing the candidate's skills and job titles, seniority, remote preference and location); if it returns fewer than 3 jobs (see 'total_jobs'), transform the candidate description into a job searching query and search the web using the 'job_searcher' tool\n2. With the information derived from step (1), pass the candidate profile (from the input resume data) and the 'result_id' you got from step (1) as the jobs to the 'evaluate_job_match' tool (do not copy the job details, the tool retrieves them from the result_id).\n\n3. From the job matching evaluation that you got from step (2), create a final response that summarizes the jobs and reports their match with the candidate. Don't forget to mention the company offering the job, the link to the job posting and the job title.\n\nDo not stop unless you completed step (1) and (2) and you created a final response."
+SUMMARY_PROMPT = "You are the ResumeMatcher agent. You are given a candidate profile, derived from the candidate's resume, and the evaluation of how much some job openings found on the web match it. Create a final response that summarizes the jobs, from the best to the worst match, and reports their match with the candidate. Don't forget to mention the company offering the job, the link to the job posting and the job title."
+workflow_lock = asyncio.Lock()
+cached_workflow: Optional[AgentWorkflow] = None
+cached_generation = -1
+
+async def get_workflow() -> AgentWorkflow:
+    # rebuilt (with a fresh MCP tool list) only after the MCP client reconnected
+    global cached_workflow, cached_generation
+    async with workflow_lock:
+        if cached_workflow is None or cached_generation != mcp_client.generation:
+            tools = await mcp_tools.to_tool_list_async()
+            agent = FunctionAgent(
+                llm = get_llm(),
+                name = "ResumeMatcher",
+                description="Useful to match resume with jobs scraped from the web",
+                system_prompt=SYSTEM_PROMPT,
+                tools = tools
+            )
+            cached_workflow = AgentWorkflow(
+                agents = [agent],
+                root_agent = agent.name
+            )
+            cached_generation = mcp_client.generation
+    return cached_workflow
+
+async def check_mcp_server() -> None:
+    await mcp_client.list_tools()
+    await get_workflow()
+
+health = HealthChecks()
+health.register("redis", redis_connection.ping)
+health.register("mcp_server", check_mcp_server)
+# fetching the agent again is a LlamaCloud round trip, so that the periodic check notices an outage after startup
+health.register("llamaextract", lambda: asyncio.to_thread(get_extractor_agent, True), timeout=30.0)
+health.register("groq", lambda: check_http(f"{groq_api_base}/models", {"Authorization": f"Bearer {groq_api_key}"}), required=False)
+health.register("supabase", lambda: asyncio.to_thread(check_supabase), required=False)
+
+def tool_call_event(tool_name: str, tool_kwargs: dict) -> ApiEvent:
+    return ApiEvent(type="tool_call", tool_name=tool_name, content=f"Calling tool **{tool_name}** with arguments:\n```json\n{json.dumps(tool_kwargs, indent = 4)}\n```\n\n")
+
+def tool_result_event(tool_name: str, tool_output) -> ApiEvent:
+    return ApiEvent(type="tool_result", tool_name=tool_name, content=f"Results from tool **{tool_name}**:\n{tool_output}\n\n")
+
+async def run_workflow(resume: str, session_id: Optional[str] = None) -> AsyncIterator[ApiEvent]:
+    workflow = await get_workflow()
+    user_msg = f"Path to resume: {resume}"
+    chat_history = await histories.get_history(session_id) if session_id is not None else []
+    if trace_id_var.get() is None:
+        trace_id_var.set(new_trace_id())
+    with track_stage("agent_workflow"):
+        handler = workflow.run(user_msg=user_msg, chat_history=chat_history)
+        async for event in handler.stream_events():
+            if isinstance(event, ToolCall):
+                yield tool_call_event(event.tool_name, event.tool_kwargs)
+            elif isinstance(event, ToolCallResult):
+                yield tool_result_event(event.tool_name, event.tool_output)
+            else:
+                continue
+        response = await handler
+    if session_id is not None:
+        await histories.add_to_history(session_id, user_msg, "user")
+        await histories.add_to_history(session_id, str(response), "assistant")
+    yield ApiEvent(type="response", content=str(response))
+
+async def call_mcp_tool(tool_name: str, arguments: dict) -> str:
+    result = await mcp_client.call_tool(tool_name, arguments)
+    output = "\n".join(content.text for content in result.content if content.type == "text")
+    if result.isError:
+        raise RuntimeError(f"Tool {tool_name} failed: {output}")
+    return output
 
-@app.post("/chat", dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+def build_search_arguments(resume: str) -> tuple[dict, dict]:
+    profile = parse_candidate_profile(resume)
+    roles = profile["potential_job_roles"] or ""
+    skills = profile["skills"] or ""
+    seniority = normalize_seniority(profile["seniority"])
+    work_location = (profile["work_location"] or "").lower()
+    index_arguments = {"skills": f"{roles}, {skills}".strip(", ")}
+    if seniority is not None:
+        index_arguments["seniority"] = seniority
+    if work_location == "remote":
+        index_arguments["remote"] = True
+    elif profile["based_in"] is not None:
+        index_arguments["location"] = profile["based_in"].split(",")[0].strip()
+    query = f"{profile['seniority'] + ' ' if profile['seniority'] is not None else ''}{roles or 'job'} openings requiring {skills or 'any skill'}"
+    if work_location != "":
+        query += f", {work_location}"
+    if profile["based_in"] is not None:
+        query += f", based in {profile['based_in']}"
+    return index_arguments, {"job_description": query}
+
+async def run_pipeline(resume: str, session_id: Optional[str] = None) -> AsyncIterator[ApiEvent]:
+    # same steps as the agent workflow, called directly: the only LLM call is the final summary
+    chat_history = await histories.get_history(session_id) if session_id is not None else []
+    if trace_id_var.get() is None:
+        trace_id_var.set(new_trace_id())
+    with track_stage("direct_pipeline"):
+        index_arguments, searcher_arguments = build_search_arguments(resume)
+        yield tool_call_event("job_index_search", index_arguments)
+        search_result = await call_mcp_tool("job_index_search", index_arguments)
+        yield tool_result_event("job_index_search", search_result)
+        if json.loads(search_result)["total_jobs"] < 3:
+            yield tool_call_event("job_searcher", searcher_arguments)
+            search_result = await call_mcp_tool("job_searcher", searcher_arguments)
+            yield tool_result_event("job_searcher", search_result)
+        evaluation_arguments = {"candidate_profile": resume, "jobs": json.loads(search_result)["result_id"]}
+        yield tool_call_event("evaluate_job_match", evaluation_arguments)
+        evaluation = await call_mcp_tool("evaluate_job_match", evaluation_arguments)
+        yield tool_result_event("evaluate_job_match", evaluation)
+        messages = [ChatMessage.from_str(role="system", content=SUMMARY_PROMPT), *chat_history, ChatMessage.from_str(role="user", content=f"Candidate profile:\n\n{resume}\n\nJob match evaluations:\n\n{evaluation}")]
+        response = (await get_llm().achat(messages)).message.content
+    if session_id is not None:
+        await histories.add_to_history(session_id, f"Path to resume: {resume}", "user")
+        await histories.add_to_history(session_id, response, "assistant")
+    yield ApiEvent(type="response", content=response)
+
+def run_matching(resume: str, session_id: Optional[str] = None, mode: Literal["agent", "pipeline"] = "agent") -> AsyncIterator[ApiEvent]:
+    if mode == "pipeline":
+        return run_pipeline(resume, session_id)
+    return run_workflow(resume, session_id)
+
+@app.post("/chat", dependencies=[Depends(SafeRateLimiter(redis_connection, times=10, seconds=60))])
 async def chat(inpt: ApiInput, x_api_key: str = Depends(check_api_key)) -> ApiOutput:
-    tools = await mcp_tools.to_tool_list_async()
-    agent = FunctionAgent(
-        llm = llm,
-        name = "ResumeMatcher",
-        description="Useful to match resume with jobs scraped from the web",
-        system_prompt="You are the ResumeMatcher agent. Your task is to match a resume with jobs you can find from the web, evaluate the matches and return to the user a comprehensive summary of these matches, using the available tools. You should follow this workflow:\n1. Starting from the candidate description deriving from the resume, transform it into a job searching query to retrieve the top matching jobs that fit the candidate profile, using the 'job_searcher' tool\n2. With the information derived from step (1), pass the candidate profile (from the input resume data) and the jobs (in the same JSON string format as you got them from step (1)) to the 'evaluate_job_match' tool.\n\n3. From the job matching evaluation that you got from step (2), create a final response that summarizes the jobs and reports their match with the candidate. Don't forget to mention the company offering the job, the link to the job posting and the job title.\n\nDo not stop unless you completed step (1) and (2) and you created a final response.",
-        tools = tools
-    )
-    workflow = AgentWorkflow(
-        agents = [agent],
-        root_agent = agent.name
-    )
     process = ""
-    handler = workflow.run(user_msg=f"Path to resume: {inpt.resume}", chat_history=hist.get_history())
-    async for event in handler.stream_events():
-        if isinstance(event, ToolCall):
-            process += f"Calling tool **{event.tool_name}** with arguments:\n```json\n{json.dumps(event.tool_kwargs, indent = 4)}\n```\n\n"
-        elif isinstance(event, ToolCallResult):
-            process += f"Results from tool **{event.tool_name}**:\n{event.tool_output}\n\n"
+    response = ""
+    async for event in run_matching(inpt.resume, f"api:{inpt.session_id}" if inpt.session_id is not None else None, inpt.mode):
+        if event.type == "response":
+            response = event.content
         else:
-            continue
-    response = await handler
-    response = str(response)
+            process += event.content
     return ApiOutput(response = response, process = process)
 
+@app.post("/chat/stream", dependencies=[Depends(SafeRateLimiter(redis_connection, times=10, seconds=60))])
+async def chat_stream(inpt: ApiInput, x_api_key: str = Depends(check_api_key)) -> StreamingResponse:
+    async def ndjson_events():
+        try:
+            async for event in run_matching(inpt.resume, f"api:{inpt.session_id}" if inpt.session_id is not None else None, inpt.mode):
+                yield event.model_dump_json() + "\n"
+        except Exception as e:
+            yield ApiEvent(type="error", content=str(e)).model_dump_json() + "\n"
+    return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def liveness() -> dict:
+    return health.liveness()
+
+@app.get("/health/ready")
+async def readiness() -> ORJSONResponse:
+    report = health.readiness()
+    return ORJSONResponse(report, status_code=200 if health.ready() else 503)
+
+@app.get("/cache/stats")
+async def cache_stats(x_api_key: str = Depends(check_api_key)) -> dict:
+    return {"resume_parser": parse_cache.stats()}
+
+def extract_resume(path_to_resume: str) -> dict:
+    with track_stage("llamaextract"):
+        response = get_extractor_agent().extract(path_to_resume)
+    return response.data
+
 def resume_parser(path_to_resume: str):
-    response = extractor_agent.extract(path_to_resume)
-    extracted_data = response.data
+    extracted_data = parse_cache.get_or_extract(path_to_resume, extract_resume)
     formatted_data = f"""
     Potential Job Roles: {', '.join(extracted_data['potential_job_titles'])}
     Seniority: {extracted_data['seniority']}
@@ -95,25 +290,66 @@ def resume_parser(path_to_resume: str):
     """
     return formatted_data
 
-def bot(resume_path: str):
-    headers = {"Content-Type": "application/json", "x-api-key": internal_key}
-    parsed_resume = resume_parser(resume_path)
-    response = rq.post("http://localhost:80/chat", json=ApiInput(resume=parsed_resume).model_dump(), headers=headers)
-    if response.status_code == 200:
-        res_json = response.json()
-        agent_process = res_json["process"]
-        answer = res_json["response"]
-        return f"<details>\n\t<summary><b>Agentic Process</b></summary>\n\n{agent_process}\n\n</details>\n\n" + answer
-    else:
-        return "An error occurred while generating your response. Please feel free to report any error to [GitHub Discussions](https://github.com/AstraBert/resume-matcher/discussions)."
+async def match_resume_file(resume_path: str) -> str:
+    trace_id_var.set(new_trace_id())
+    parsed_resume = await asyncio.to_thread(resume_parser, resume_path)
+    async for event in run_workflow(parsed_resume):
+        if event.type == "response":
+            return event.content
+    raise RuntimeError("The agent workflow ended without a response")
+
+batch_queue = BatchQueue(match_resume_file, workers=int(os.environ.get("BATCH_WORKERS", "4")), retention=float(os.environ.get("BATCH_RETENTION_DAYS", "7")) * 24 * 3600)
+
+@app.post("/batch", dependencies=[Depends(SafeRateLimiter(redis_connection, times=5, seconds=60))])
+async def submit_batch(resumes: List[UploadFile] = File(...), x_api_key: str = Depends(check_api_key)) -> BatchSubmission:
+    batch_id = await batch_queue.submit([(resume.filename or "resume", await resume.read()) for resume in resumes])
+    return BatchSubmission(batch_id=batch_id, total=len(resumes))
+
+@app.get("/batch/{batch_id}")
+async def batch_status(batch_id: str, x_api_key: str = Depends(check_api_key)) -> BatchStatus:
+    status = batch_queue.get(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+@app.get("/batch/{batch_id}/stream")
+async def batch_stream(batch_id: str, x_api_key: str = Depends(check_api_key)) -> StreamingResponse:
+    if batch_queue.get(batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    async def ndjson_items():
+        async for item in batch_queue.watch(batch_id):
+            yield item.model_dump_json() + "\n"
+    return StreamingResponse(ndjson_items(), media_type="application/x-ndjson")
+
+async def bot(resume_path: str, mode: str, request: gr.Request):
+    trace_id_var.set(new_trace_id())
+    error_message = "An error occurred while generating your response. Please feel free to report any error to [GitHub Discussions](https://github.com/AstraBert/resume-matcher/discussions)."
+    retry_after = await user_rate_limiter.check(request.username)
+    if retry_after != 0:
+        yield f"### Too many requests: please try again in {ceil(retry_after / 1000)} seconds."
+        return
+    yield "### Parsing your resume..."
+    parsed_resume = await asyncio.to_thread(resume_parser, resume_path)
+    yield "### Searching and evaluating jobs for your profile..."
+    agent_process = ""
+    try:
+        async for event in run_matching(parsed_resume, f"user:{request.username}", mode):
+            if event.type == "response":
+                yield f"<details>\n\t<summary><b>Agentic Process</b></summary>\n\n{agent_process}\n\n</details>\n\n" + event.content
+            else:
+                agent_process += event.content
+                yield f"<details open>\n\t<summary><b>Agentic Process</b></summary>\n\n{agent_process}\n\n</details>\n\n### Working on it..."
+    except Exception:
+        yield error_message
 
 with gr.Blocks(theme=gr.themes.Soft(), title="Match-Your-Resume") as demo:
     title = gr.HTML("<h2 align='center'>Match your resume with a job, effortlessly</h2>")
     with gr.Row():
         with gr.Column():
             chat_input = gr.File(label="Upload your resume here", file_count="single", file_types=[".pdf", ".PDF", ".docx", ".DOCX", ".doc", ".DOC"])
+            mode_input = gr.Radio(choices=[("Agent (the LLM plans the search)", "agent"), ("Direct pipeline (faster, fixed steps)", "pipeline")], value="agent", label="Matching mode")
             md_output = gr.Markdown(label="Matches", container=True, value="### No resume uploaded yet", show_label=True, show_copy_button=True)
-            btn = gr.Button("Match your resume!⚗️").click(fn=bot, inputs=[chat_input], outputs=[md_output])
+            btn = gr.Button("Match your resume!⚗️").click(fn=bot, inputs=[chat_input, mode_input], outputs=[md_output])
 
 with gr.Blocks() as donation:
     gr.HTML("""<h2 align="center">If you find Match-Your-Resume useful, please consider to support us through donation:</h2>
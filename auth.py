@@ -1,10 +1,13 @@
-from supabase import create_client
+from supabase import Client, create_client
 from hashlib import sha256
+import os
 
-with open("/run/secrets/supa_key") as f:
+secrets_dir = os.environ.get("SECRETS_DIR", "/run/secrets")
+
+with open(f"{secrets_dir}/supa_key") as f:
     supa_key = f.read()
 f.close()
-with open("/run/secrets/supa_url") as g:
+with open(f"{secrets_dir}/supa_url") as g:
     supa_url = g.read()
 g.close()
 
@@ -17,10 +20,19 @@ class Encrypter:
         return enc.hexdigest()
     
 encryption = Encrypter()
-supa_client = create_client(supabase_key=supa_key, supabase_url=supa_url)
+supa_client: Client | None = None
+
+def get_supa_client() -> Client:
+    global supa_client
+    if supa_client is None:
+        supa_client = create_client(supabase_key=supa_key, supabase_url=supa_url)
+    return supa_client
+
+def check_supabase() -> None:
+    get_supa_client().from_("users_resume_matcher").select("username").limit(1).execute()
 
 def authenticate_user(username: str, password: str):
-    response = supa_client.from_("users_resume_matcher").select("*").eq("username", username).eq("password", encryption.encrypt(password)).execute()
+    response = get_supa_client().from_("users_resume_matcher").select("*").eq("username", username).eq("password", encryption.encrypt(password)).execute()
     data = response.data
     if len(data) > 0:
         return True
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pydantic import BaseModel
+from typing import AsyncIterator, Awaitable, Callable, List, Literal, Optional
+
+
+class BatchItem(BaseModel):
+    item_index: int
+    filename: str
+    status: Literal["pending", "running", "done", "failed"]
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    created_at: float
+    total: int
+    completed: int
+    items: List[BatchItem]
+
+
+class BatchQueue:
+    """
+    Persistent queue of resume matching jobs, processed by a pool of async workers.
+
+    Items are stored in SQLite, so the ones still pending or running when the app stops are queued again at the next start.
+    Uploaded resumes are deleted as soon as their item is done or failed, and batches are deleted `retention` seconds after
+    their creation.
+    """
+    def __init__(self, process_fn: Callable[[str], Awaitable[str]], db_path: str = "cache/batches.db", upload_dir: str = "cache/batch_uploads", workers: int = 4, max_attempts: int = 2, retention: float = 7 * 24 * 3600, cleanup_interval: float = 3600) -> None:
+        self.process_fn = process_fn
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.cleanup_interval = cleanup_interval
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("CREATE TABLE IF NOT EXISTS batches (batch_id TEXT PRIMARY KEY, created_at REAL NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS batch_items (batch_id TEXT NOT NULL, item_index INTEGER NOT NULL, filename TEXT NOT NULL, resume_path TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, updated_at REAL NOT NULL, PRIMARY KEY (batch_id, item_index))")
+        self.connection.commit()
+        self.queue: asyncio.Queue[tuple[str, int]] | None = None
+        self.updated: asyncio.Condition | None = None
+        self.tasks: List[asyncio.Task] = []
+    def _execute(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+            self.connection.commit()
+        return rows
+    async def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self.updated = asyncio.Condition()
+        self._execute("UPDATE batch_items SET status = 'pending' WHERE status = 'running'")
+        for row in self._execute("SELECT batch_id, item_index FROM batch_items WHERE status = 'pending' ORDER BY updated_at"):
+            self.queue.put_nowait((row["batch_id"], row["item_index"]))
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._cleanup_loop()))
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+    def _remove_upload(self, resume_path: str) -> None:
+        try:
+            os.remove(resume_path)
+        except FileNotFoundError:
+            pass
+    def cleanup(self) -> int:
+        """Delete the batches older than `retention` (unless some of their items are still queued), with their items and uploads. Returns the number of deleted batches."""
+        expired = [row["batch_id"] for row in self._execute("SELECT batch_id FROM batches WHERE created_at < ? AND NOT EXISTS (SELECT 1 FROM batch_items WHERE batch_items.batch_id = batches.batch_id AND status IN ('pending', 'running'))", (time.time() - self.retention,))]
+        for batch_id in expired:
+            self._execute("DELETE FROM batch_items WHERE batch_id = ?", (batch_id,))
+            self._execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+            shutil.rmtree(os.path.join(self.upload_dir, batch_id), ignore_errors=True)
+        return len(expired)
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.cleanup)
+            except Exception as e:
+                print(f"Could not clean up the expired batches: {type(e).__name__}: {e}", flush=True)
+            await asyncio.sleep(self.cleanup_interval)
+    async def _notify(self) -> None:
+        async with self.updated:
+            self.updated.notify_all()
+    async def _process(self, batch_id: str, item_index: int) -> None:
+        rows = self._execute("UPDATE batch_items SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE batch_id = ? AND item_index = ? RETURNING resume_path, attempts", (time.time(), batch_id, item_index))
+        if len(rows) == 0:
+            # the batch was deleted while the item was queued
+            return
+        row = rows[0]
+        await self._notify()
+        try:
+            result = await self.process_fn(row["resume_path"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if row["attempts"] < self.max_attempts:
+                self._execute("UPDATE batch_items SET status = 'pending', error = ?, updated_at = ? WHERE batch_id = ? AND item_index = ?", (str(e), time.time(), batch_id, item_index))
+                self.queue.put_nowait((batch_id, item_index))
+            else:
+                self._execute("UPDATE batch_items SET status = 'failed', error = ?, updated_at = ? WHERE batch_id = ? AND item_index = ?", (str(e), time.time(), batch_id, item_index))
+                self._remove_upload(row["resume_path"])
+        else:
+            self._execute("UPDATE batch_items SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE batch_id = ? AND item_index = ?", (result, time.time(), batch_id, item_index))
+            self._remove_upload(row["resume_path"])
+    async def _worker(self) -> None:
+        while True:
+            batch_id, item_index = await self.queue.get()
+            try:
+                await self._process(batch_id, item_index)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # an error of the queue itself (e.g. SQLite) must not kill the worker and shrink the pool
+                print(f"Batch worker failed on item {item_index} of batch {batch_id}: {type(e).__name__}: {e}", flush=True)
+            finally:
+                self.queue.task_done()
+            await self._notify()
+    async def submit(self, resumes: List[tuple[str, bytes]]) -> str:
+        """Store the (filename, content) resumes of a new batch and queue them. Returns the batch id."""
+        batch_id = uuid.uuid4().hex
+        batch_dir = os.path.join(self.upload_dir, batch_id)
+        os.makedirs(batch_dir, exist_ok=True)
+        now = time.time()
+        self._execute("INSERT INTO batches (batch_id, created_at) VALUES (?, ?)", (batch_id, now))
+        for item_index, (filename, content) in enumerate(resumes):
+            resume_path = os.path.join(batch_dir, f"{item_index}_{os.path.basename(filename)}")
+            with open(resume_path, "wb") as f:
+                f.write(content)
+            self._execute("INSERT INTO batch_items (batch_id, item_index, filename, resume_path, status, updated_at) VALUES (?, ?, ?, ?, 'pending', ?)", (batch_id, item_index, filename, resume_path, now))
+            self.queue.put_nowait((batch_id, item_index))
+        return batch_id
+    def get(self, batch_id: str) -> Optional[BatchStatus]:
+        batch = self._execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,))
+        if len(batch) == 0:
+            return None
+        items = [BatchItem(item_index=row["item_index"], filename=row["filename"], status=row["status"], result=row["result"], error=row["error"]) for row in self._execute("SELECT * FROM batch_items WHERE batch_id = ? ORDER BY item_index", (batch_id,))]
+        return BatchStatus(batch_id=batch_id, created_at=batch[0]["created_at"], total=len(items), completed=sum(1 for item in items if item.status in ("done", "failed")), items=items)
+    async def watch(self, batch_id: str) -> AsyncIterator[BatchItem]:
+        """Yield every status change of the items of a batch, until all of them are done or failed."""
+        last_seen: dict[int, str] = {}
+        while True:
+            status = self.get(batch_id)
+            if status is None:
+                # deleted by the cleanup
+                return
+            for item in status.items:
+                if last_seen.get(item.item_index) != item.status:
+                    last_seen[item.item_index] = item.status
+                    yield item
+            if status.completed == status.total:
+                return
+            async with self.updated:
+                try:
+                    await asyncio.wait_for(self.updated.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,194 @@
+"""
+Offline load test of Match-Your-Resume.
+
+The benchmark starts the fake upstreams (benchmarks/fake_upstreams.py) and the MCP server (server.py, in SSE mode) as
+subprocesses pointed at them, imports the FastAPI app in-process with LlamaExtract replaced by FakeLlamaExtract, and then
+drives each target at increasing concurrency, reporting p50/p95/p99 latency, requests per second, errors and memory.
+
+Run it from the repository root, in the project environment:
+
+    python benchmarks/benchmark.py --targets chat chat_pipeline job_searcher evaluate_job_match resume_parser auth --concurrency 1 4 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+TARGETS = ["chat", "chat_pipeline", "job_searcher", "evaluate_job_match", "resume_parser", "auth"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Nothing is listening on port {port} after {timeout} seconds")
+
+
+def rss_mb(pid: int | str = "self") -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if len(values) == 0:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def sample_profile(index: int) -> str:
+    skills = ["Python", "FastAPI", "PostgreSQL", "Docker", "Kubernetes", "AWS", "React", "Go", "Spark", "SQL"]
+    return f"""
+    Potential Job Roles: Backend Engineer, Platform Engineer
+    Seniority: {["junior", "mid-level", "senior"][index % 3]}
+    Skills: {', '.join(skills[index % 5:index % 5 + 5])}
+    Based in: Berlin, Germany
+    Working location: remote, hybrid
+    """
+
+
+async def run_level(name: str, call, concurrency: int, requests: int, mcp_pid: int, llm_tokens) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(index)
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+    tokens_before = llm_tokens()
+    start = time.perf_counter()
+    await asyncio.gather(*[one(index) for index in range(requests)])
+    elapsed = time.perf_counter() - start
+    return {"target": name, "concurrency": concurrency, "requests": requests, "errors": errors, "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99), "rps": len(latencies) / elapsed, "llm_tokens_per_request": (llm_tokens() - tokens_before) / requests, "app_rss_mb": rss_mb(), "app_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "app_traced_peak_mb": tracemalloc.get_traced_memory()[1] / 1024 / 1024, "mcp_rss_mb": rss_mb(mcp_pid)}
+
+
+async def benchmark(args: argparse.Namespace, mcp_pid: int, workdir: str) -> list[dict]:
+    import httpx
+    import llama_cloud_services
+    from fake_upstreams import FakeLlamaExtract, UpstreamSettings
+    FakeLlamaExtract.settings = UpstreamSettings(args.llamaextract_latency, args.failure_rate)
+    llama_cloud_services.LlamaExtract = FakeLlamaExtract
+    sys.path.insert(0, REPO_DIR)
+    import api
+    import auth
+    from metrics import LLM_TOKENS
+    from fastapi_limiter.depends import RateLimiter
+    for route in api.app.routes:
+        for dependency in getattr(route, "dependencies", []):
+            if isinstance(dependency.dependency, RateLimiter):
+                api.app.dependency_overrides[dependency.dependency] = lambda: None
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://app", timeout=None)
+    headers = {"x-api-key": api.internal_key}
+    run_id = uuid.uuid4().hex[:8]
+    sample_jobs = json.loads((await api.mcp_client.call_tool("job_searcher", {"job_description": "python backend engineer warm-up"})).content[0].text)["result_id"]
+    resume_dir = os.path.join(workdir, "resumes")
+    os.makedirs(resume_dir, exist_ok=True)
+    def resume_file() -> str:
+        # random content, so that every request misses the resume parse cache
+        path = os.path.join(resume_dir, f"{uuid.uuid4().hex}.pdf")
+        with open(path, "wb") as f:
+            f.write(os.urandom(2048))
+        return path
+    async def call_chat(index: int) -> None:
+        response = await client.post("/chat", json={"resume": sample_profile(index)}, headers=headers)
+        response.raise_for_status()
+    async def call_chat_pipeline(index: int) -> None:
+        response = await client.post("/chat", json={"resume": sample_profile(index), "mode": "pipeline"}, headers=headers)
+        response.raise_for_status()
+    async def call_job_searcher(index: int) -> None:
+        result = await api.mcp_client.call_tool("job_searcher", {"job_description": f"python backend engineer {run_id} {index}"})
+        if result.isError:
+            raise RuntimeError(result.content[0].text)
+    async def call_evaluate_job_match(index: int) -> None:
+        result = await api.mcp_client.call_tool("evaluate_job_match", {"candidate_profile": sample_profile(index), "jobs": sample_jobs})
+        if result.isError:
+            raise RuntimeError(result.content[0].text)
+    async def call_resume_parser(index: int) -> None:
+        await asyncio.to_thread(api.resume_parser, resume_file())
+    async def call_auth(index: int) -> None:
+        if not await asyncio.to_thread(auth.authenticate_user, f"user{index}", "Password-1"):
+            raise RuntimeError("Authentication failed")
+    calls = {"chat": call_chat, "chat_pipeline": call_chat_pipeline, "job_searcher": call_job_searcher, "evaluate_job_match": call_evaluate_job_match, "resume_parser": call_resume_parser, "auth": call_auth}
+    results = []
+    for target in args.targets:
+        for concurrency in args.concurrency:
+            result = await run_level(target, calls[target], concurrency, max(args.requests, concurrency), mcp_pid, lambda: sum(LLM_TOKENS.values.values()))
+            results.append(result)
+            print(f"{result['target']:<20} c={result['concurrency']:<4} n={result['requests']:<5} err={result['errors']:<4} p50={result['p50']:.3f}s p95={result['p95']:.3f}s p99={result['p99']:.3f}s rps={result['rps']:.2f} tokens/req={result['llm_tokens_per_request']:.0f} app_rss={result['app_rss_mb']:.0f}MB mcp_rss={result['mcp_rss_mb']:.0f}MB", flush=True)
+    await client.aclose()
+    await api.mcp_client.aclose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="+", default=TARGETS, choices=TARGETS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per target and concurrency level (at least the concurrency)")
+    parser.add_argument("--groq_latency", type=float, default=0.5)
+    parser.add_argument("--linkup_latency", type=float, default=2.0)
+    parser.add_argument("--supabase_latency", type=float, default=0.05)
+    parser.add_argument("--llamaextract_latency", type=float, default=3.0)
+    parser.add_argument("--failure_rate", type=float, default=0.0)
+    parser.add_argument("--jobs_per_search", type=int, default=10)
+    parser.add_argument("--output", type=str, default=None, help="Optional path of a JSON file where to save the results")
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="resume_matcher_bench_")
+    secrets_dir = os.path.join(workdir, "secrets")
+    os.makedirs(secrets_dir)
+    upstream_port, mcp_port = free_port(), free_port()
+    secrets = {"groq_key": "fake-groq-key", "linkup_key": "fake-linkup-key", "llamacloud_key": "fake-llamacloud-key", "supa_key": "fake.supabase.key", "supa_url": f"http://127.0.0.1:{upstream_port}", "internal_key": "benchmark-internal-key"}
+    for name, value in secrets.items():
+        with open(os.path.join(secrets_dir, name), "w") as f:
+            f.write(value)
+    env = {**os.environ, "SECRETS_DIR": secrets_dir, "GROQ_API_BASE": f"http://127.0.0.1:{upstream_port}/openai/v1", "LINKUP_BASE_URL": f"http://127.0.0.1:{upstream_port}/v1", "MCP_SERVER_URL": f"http://127.0.0.1:{mcp_port}/sse", "FASTMCP_PORT": str(mcp_port), "FASTMCP_HOST": "127.0.0.1"}
+    upstreams = subprocess.Popen([sys.executable, os.path.join(BENCHMARKS_DIR, "fake_upstreams.py"), "--port", str(upstream_port), "--groq_latency", str(args.groq_latency), "--linkup_latency", str(args.linkup_latency), "--supabase_latency", str(args.supabase_latency), "--failure_rate", str(args.failure_rate), "--jobs_per_search", str(args.jobs_per_search)], env=env)
+    mcp_server = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "server.py"), "--server_type", "sse"], env=env, cwd=workdir, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(mcp_port)
+        os.environ.update(env)
+        os.chdir(workdir)
+        sys.path.insert(0, BENCHMARKS_DIR)
+        tracemalloc.start()
+        results = asyncio.run(benchmark(args, mcp_server.pid, workdir))
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=4)
+    finally:
+        mcp_server.terminate()
+        upstreams.terminate()
+
+
+if __name__ == "__main__":
+    main()
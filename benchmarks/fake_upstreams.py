@@ -0,0 +1,173 @@
+"""
+Local stand-ins for the external services used by Match-Your-Resume, with configurable latency and failure rate.
+
+- Groq: OpenAI-compatible chat completions (plain, streaming and tool calling) at /openai/v1/chat/completions, and the model list.
+  Agent requests are scripted to follow the ResumeMatcher workflow (search, evaluate, summarize) and structured-output
+  requests for JobMatchEvaluation get a random match score.
+- Linkup: structured search at /v1/search, returning a deterministic list of job postings for each query.
+- Supabase: the users_resume_matcher table at /rest/v1/users_resume_matcher, where every user exists.
+- LlamaExtract: FakeLlamaExtract, an in-process drop-in replacement of llama_cloud_services.LlamaExtract.
+"""
+
+import argparse
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+import zlib
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from types import SimpleNamespace
+
+SKILLS = ["Python", "FastAPI", "Django", "PostgreSQL", "Docker", "Kubernetes", "AWS", "React", "TypeScript", "Go", "Rust", "Java", "Spark", "Airflow", "PyTorch", "SQL", "Terraform", "Redis"]
+TITLES = ["Backend Engineer", "Data Engineer", "Full Stack Developer", "Machine Learning Engineer", "Platform Engineer", "Software Engineer"]
+LEVELS = ["internship", "entry level", "junior", "mid-level", "senior"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Soylent"]
+LOCATIONS = [None, "Berlin", "London", "New York", "Remote - EU", "Milan"]
+
+
+class UpstreamSettings:
+    def __init__(self, latency: float = 0.2, failure_rate: float = 0.0, jobs_per_search: int = 10) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jobs_per_search = jobs_per_search
+    async def simulate(self) -> bool:
+        """Sleep for a jittered latency and return whether this call should fail."""
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        return random.random() < self.failure_rate
+
+
+def fake_jobs(query: str, count: int) -> dict:
+    rng = random.Random(zlib.crc32(query.encode()))
+    jobs = []
+    for index in range(count):
+        location = rng.choice(LOCATIONS)
+        jobs.append({"job_title": f"{rng.choice(['Senior ', 'Junior ', ''])}{rng.choice(TITLES)}", "experience_level": rng.choice(LEVELS), "required_skills": rng.sample(SKILLS, rng.randint(3, 6)), "remote": location is None or location.startswith("Remote"), "location": location, "salary": rng.choice([None, rng.randrange(40000, 160000, 5000)]), "job_post_url": f"https://jobs.example.com/{zlib.crc32(query.encode())}/{index}", "company": rng.choice(COMPANIES)})
+    return {"jobs": jobs}
+
+
+def tool_output_text(content: str) -> str:
+    """Recover the text of an MCP tool result, which the agent receives as the repr of a CallToolResult."""
+    match = re.search(r"text=('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")", content)
+    return ast.literal_eval(match.group(1)) if match is not None else content
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def scripted_agent_turn(messages: list, tool_names: list) -> tuple[str | None, dict | None]:
+    """Decide the next step of the ResumeMatcher agent: returns either a (tool name, arguments) call or (None, {"content": answer})."""
+    called = {tool_call["id"]: tool_call["function"]["name"] for message in messages for tool_call in (message.get("tool_calls") or [])}
+    results = [(called.get(message.get("tool_call_id")), message_text(message)) for message in messages if message["role"] == "tool"]
+    user_message = next((message_text(message) for message in reversed(messages) if message["role"] == "user"), "")
+    if len(results) == 0:
+        skills = re.search(r"Skills:\s*(.*)", user_message)
+        return "job_searcher", {"job_description": f"{skills.group(1) if skills is not None else user_message[:200]} job openings".strip()}
+    last_tool, last_output = results[-1]
+    if last_tool in ("job_searcher", "job_index_search") and "evaluate_job_match" in tool_names:
+        return "evaluate_job_match", {"candidate_profile": user_message, "jobs": json.loads(tool_output_text(last_output))["result_id"]}
+    return None, {"content": f"Here is a summary of the matching jobs I found for you:\n\n{tool_output_text(last_output)[:1500]}"}
+
+
+def completion_response(model: str, content: str | None, tool_call: tuple[str, dict] | None, prompt_tokens: int, stream: bool):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    completion_tokens = len((content or json.dumps(tool_call[1] if tool_call else "")).split())
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+    tool_calls = None if tool_call is None else [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": tool_call[0], "arguments": json.dumps(tool_call[1])}}]
+    finish_reason = "tool_calls" if tool_calls is not None else "stop"
+    if not stream:
+        return JSONResponse({"id": completion_id, "object": "chat.completion", "created": created, "model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": content, "tool_calls": tool_calls}, "finish_reason": finish_reason}], "usage": usage})
+    def chunk(delta: dict, finish: str | None, with_usage: bool = False) -> str:
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+        if with_usage:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload)}\n\n"
+    async def events():
+        if tool_calls is not None:
+            yield chunk({"role": "assistant", "content": None, "tool_calls": [{"index": 0, **tool_calls[0]}]}, None)
+        else:
+            words = content.split(" ")
+            for start in range(0, len(words), 8):
+                yield chunk({"role": "assistant", "content": " ".join(words[start:start + 8]) + " "}, None)
+                await asyncio.sleep(0)
+        yield chunk({}, finish_reason, with_usage=True)
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(groq: UpstreamSettings, linkup: UpstreamSettings, supabase: UpstreamSettings) -> FastAPI:
+    app = FastAPI()
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if await groq.simulate():
+            return JSONResponse({"error": {"message": "Simulated Groq failure", "type": "server_error"}}, status_code=503)
+        tool_names = [tool["function"]["name"] for tool in body.get("tools") or []]
+        prompt_tokens = sum(len(message_text(message).split()) for message in body["messages"])
+        if "JobMatchEvaluation" in tool_names:
+            return completion_response(body["model"], None, ("JobMatchEvaluation", {"match_score": random.randint(30, 95), "reasons": "Simulated evaluation: partial overlap between the required skills and the candidate's skills."}), prompt_tokens, body.get("stream", False))
+        if "job_searcher" in tool_names:
+            tool_name, arguments = scripted_agent_turn(body["messages"], tool_names)
+            if tool_name is not None:
+                return completion_response(body["model"], None, (tool_name, arguments), prompt_tokens, body.get("stream", False))
+            return completion_response(body["model"], arguments["content"], None, prompt_tokens, body.get("stream", False))
+        return completion_response(body["model"], "Simulated summary of the job matches: the best opportunities are listed above, with their companies, links and match scores.", None, prompt_tokens, body.get("stream", False))
+    @app.get("/openai/v1/models")
+    async def models():
+        return JSONResponse({"object": "list", "data": [{"id": model, "object": "model", "owned_by": "benchmark"} for model in ("llama-3.3-70b-versatile", "qwen-qwq-32b")]})
+    @app.post("/v1/search")
+    async def linkup_search(request: Request):
+        body = await request.json()
+        if await linkup.simulate():
+            return JSONResponse({"error": {"code": "INTERNAL", "message": "Simulated Linkup failure", "details": []}}, status_code=500)
+        return JSONResponse(fake_jobs(body["q"], linkup.jobs_per_search))
+    @app.get("/rest/v1/users_resume_matcher")
+    async def supabase_users(request: Request):
+        if await supabase.simulate():
+            return JSONResponse({"message": "Simulated Supabase failure", "code": "500"}, status_code=500)
+        username = request.query_params.get("username", "eq.benchmark").removeprefix("eq.")
+        return JSONResponse([{"username": username, "email": f"{username}@example.com", "password": request.query_params.get("password", "").removeprefix("eq.")}])
+    return app
+
+
+class FakeExtractAgent:
+    def __init__(self, settings: UpstreamSettings) -> None:
+        self.settings = settings
+    def extract(self, path: str):
+        time.sleep(self.settings.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.settings.failure_rate:
+            raise RuntimeError("Simulated LlamaExtract failure")
+        with open(path, "rb") as f:
+            rng = random.Random(zlib.crc32(f.read()))
+        return SimpleNamespace(data={"potential_job_titles": rng.sample(TITLES, 2), "seniority": rng.choice(LEVELS[1:]), "skills": rng.sample(SKILLS, 6), "based_in": rng.choice(["Berlin, Germany", "London, UK", None]), "work_location": rng.choice(["remote", "hybrid", "remote, hybrid", None])})
+
+
+class FakeLlamaExtract:
+    """Drop-in replacement of llama_cloud_services.LlamaExtract, whose agents sleep instead of calling LlamaCloud."""
+    settings = UpstreamSettings(latency=1.0)
+    def __init__(self, api_key: str | None = None, **kwargs) -> None:
+        self.api_key = api_key
+    def get_agent(self, name: str | None = None, **kwargs) -> FakeExtractAgent:
+        return FakeExtractAgent(self.settings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--groq_latency", type=float, default=0.5, help="Mean latency (in seconds) of a Groq chat completion")
+    parser.add_argument("--linkup_latency", type=float, default=2.0, help="Mean latency (in seconds) of a Linkup search")
+    parser.add_argument("--supabase_latency", type=float, default=0.05, help="Mean latency (in seconds) of a Supabase query")
+    parser.add_argument("--failure_rate", type=float, default=0.0, help="Probability that an upstream call fails")
+    parser.add_argument("--jobs_per_search", type=int, default=10, help="Number of job postings returned by each Linkup search")
+    args = parser.parse_args()
+    app = create_app(UpstreamSettings(args.groq_latency, args.failure_rate), UpstreamSettings(args.linkup_latency, args.failure_rate, args.jobs_per_search), UpstreamSettings(args.supabase_latency, args.failure_rate))
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from hashlib import sha256
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class ResumeParseCache:
+    def __init__(self, db_path: str = "cache/resume_parse_cache.db", max_memory_entries: int = 128, max_disk_entries: int = 5000, max_age: float = 30 * 24 * 3600) -> None:
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age = max_age
+        self.memory: OrderedDict[str, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.deduplicated = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, Future] = {}
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS parsed_resumes (file_hash TEXT PRIMARY KEY, extracted_data TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+        self.connection.commit()
+    @staticmethod
+    def hash_file(path: str) -> str:
+        hasher = sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    def _is_expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.max_age
+    def _put_memory(self, key: str, created_at: float, data: Dict[str, Any]) -> None:
+        self.memory[key] = (created_at, data)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            if key in self.memory:
+                created_at, data = self.memory[key]
+                if not self._is_expired(created_at):
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return data
+                del self.memory[key]
+            row = self.connection.execute("SELECT extracted_data, created_at FROM parsed_resumes WHERE file_hash = ?", (key,)).fetchone()
+            if row is not None and not self._is_expired(row[1]):
+                data = json.loads(row[0])
+                self.connection.execute("UPDATE parsed_resumes SET last_access = ? WHERE file_hash = ?", (time.time(), key))
+                self.connection.commit()
+                self._put_memory(key, row[1], data)
+                self.hits += 1
+                self.disk_hits += 1
+                return data
+            self.misses += 1
+            return None
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        now = time.time()
+        with self.lock:
+            self._put_memory(key, now, data)
+            self.connection.execute("INSERT OR REPLACE INTO parsed_resumes (file_hash, extracted_data, created_at, last_access) VALUES (?, ?, ?, ?)", (key, json.dumps(data), now, now))
+            self.connection.execute("DELETE FROM parsed_resumes WHERE created_at < ?", (now - self.max_age,))
+            self.connection.execute("DELETE FROM parsed_resumes WHERE file_hash NOT IN (SELECT file_hash FROM parsed_resumes ORDER BY last_access DESC LIMIT ?)", (self.max_disk_entries,))
+            self.connection.commit()
+    def get_or_extract(self, path: str, extract_fn: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached extraction for the file at `path`, calling `extract_fn` only on a cache miss (once for concurrent identical files)."""
+        key = self.hash_file(path)
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self.lock:
+            future = self.in_flight.get(key)
+            cached = key in self.memory and not self._is_expired(self.memory[key][0])
+            if cached or future is not None:
+                # stored or being extracted since our lookup: served without another extraction, so it is a hit
+                self.misses -= 1
+                self.hits += 1
+                if cached:
+                    return self.memory[key][1]
+                self.deduplicated += 1
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            data = extract_fn(path)
+            self.put(key, data)
+            future.set_result(data)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+        return data
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "deduplicated": self.deduplicated, "misses": self.misses, "hit_rate": self.hits / total if total > 0 else 0.0, "memory_entries": len(self.memory)}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and sort the tokens of a search query, so that near-identical queries share a cache key."""
+    return " ".join(sorted(query.lower().split()))
+
+
+class InMemoryBackend:
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.store: OrderedDict[str, tuple[float, str]] = OrderedDict()
+    async def get(self, key: str) -> Optional[str]:
+        if key not in self.store:
+            return None
+        expires_at, value = self.store[key]
+        if time.time() >= expires_at:
+            del self.store[key]
+            return None
+        self.store.move_to_end(key)
+        return value
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self.store[key] = (time.time() + ttl, value)
+        self.store.move_to_end(key)
+        while len(self.store) > self.max_entries:
+            self.store.popitem(last=False)
+
+
+class RedisBackend:
+    def __init__(self, url: str = "redis://resume_matcher_redis:6379") -> None:
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, encoding="utf8", decode_responses=True)
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(key)
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+
+class SearchCache:
+    def __init__(self, backend: InMemoryBackend | RedisBackend, ttl: float = 6 * 3600, prefix: str = "job_search") -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+    def key_for(self, query: str) -> str:
+        return f"{self.prefix}:{sha256(normalize_query(query).encode()).hexdigest()}"
+    async def _search_and_store(self, key: str, query: str, search_fn: Callable[[str], Awaitable[str]]) -> str:
+        result = await search_fn(query)
+        try:
+            await self.backend.set(key, result, self.ttl)
+        except Exception as e:
+            # the search result is still good (and already paid for): return it uncached
+            self.backend_errors += 1
+            print(f"Could not store the job search result in the cache: {type(e).__name__}: {e}", flush=True)
+        return result
+    async def get_or_search(self, query: str, search_fn: Callable[[str], Awaitable[str]]) -> str:
+        """Return the cached result for `query`, running `search_fn` at most once for concurrent identical queries."""
+        key = self.key_for(query)
+        if key in self.in_flight:
+            self.hits += 1
+            return await asyncio.shield(self.in_flight[key])
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            # an unavailable cache backend is treated as a miss, so that it does not turn into a job search outage
+            self.backend_errors += 1
+            print(f"Could not read the job search cache, treating it as a miss: {type(e).__name__}: {e}", flush=True)
+            cached = None
+        if key in self.in_flight:
+            self.hits += 1
+            return await asyncio.shield(self.in_flight[key])
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        task = asyncio.ensure_future(self._search_and_store(key, query, search_fn))
+        self.in_flight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self.in_flight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total > 0 else 0.0, "in_flight": len(self.in_flight), "backend_errors": self.backend_errors}
+
+
+class ResultStore:
+    """Server-side store of tool results, so that the agent can pass a short result id between tools instead of the full payload."""
+    def __init__(self, backend: InMemoryBackend | RedisBackend, ttl: float = 3600, prefix: str = "job_results") -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        # used when the backend is unavailable, so that a Redis outage does not fail the job searches
+        self.fallback = InMemoryBackend(max_entries=512)
+    async def put(self, value: str) -> str:
+        """Store `value` and return its result id (derived from the content, so identical results share the same id)."""
+        result_id = f"jobs_{sha256(value.encode()).hexdigest()[:16]}"
+        key = f"{self.prefix}:{result_id}"
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Could not store the result in the result store, keeping it in memory: {type(e).__name__}: {e}", flush=True)
+            await self.fallback.set(key, value, self.ttl)
+        return result_id
+    async def get(self, result_id: str) -> Optional[str]:
+        key = f"{self.prefix}:{result_id.strip()}"
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"Could not read the result store, looking for the result in memory: {type(e).__name__}: {e}", flush=True)
+            value = None
+        return value if value is not None else await self.fallback.get(key)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
+
+
+class HealthChecks:
+    """
+    Status of the upstream dependencies of a service, for the liveness and readiness probes.
+
+    All the checks start concurrently in a background task at startup, each one bounded by its timeout, so that the service can
+    boot (and answer the liveness probe) while its upstreams warm up. The same task then re-runs the failed checks every
+    `retry_interval` seconds and the passing ones every `check_interval` seconds, so that the status follows the upstreams without
+    depending on probe traffic. The readiness probe only reads the last known status. The service is ready when all its required
+    dependencies are.
+    """
+    def __init__(self, retry_interval: float = 10.0, check_interval: float = 30.0) -> None:
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self.checks: Dict[str, tuple[Callable[[], Awaitable[Any]], bool, float]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self.loop_task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+    def register(self, name: str, check: Callable[[], Awaitable[Any]], required: bool = True, timeout: float = 10.0) -> None:
+        self.checks[name] = (check, required, timeout)
+        self.status[name] = {"status": "pending", "required": required, "error": None, "duration": None, "checked_at": None}
+    async def _check(self, name: str) -> None:
+        check, _, timeout = self.checks[name]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.status[name].update(status="error", error=f"Timed out after {timeout} seconds")
+        except Exception as e:
+            self.status[name].update(status="error", error=f"{type(e).__name__}: {e}")
+        else:
+            self.status[name].update(status="ok", error=None)
+        self.status[name].update(duration=round(time.perf_counter() - start, 3), checked_at=time.time())
+        if self.status[name]["status"] == "error":
+            print(f"Health check '{name}' failed, it will be retried in the background: {self.status[name]['error']}", flush=True)
+    def _due(self, name: str, now: float) -> bool:
+        if name in self.running and not self.running[name].done():
+            return False
+        status = self.status[name]
+        if status["checked_at"] is None:
+            return True
+        return now - status["checked_at"] >= (self.check_interval if status["status"] == "ok" else self.retry_interval)
+    async def _loop(self) -> None:
+        while True:
+            now = time.time()
+            for name in self.checks:
+                if self._due(name, now):
+                    self.running[name] = asyncio.create_task(self._check(name))
+            await asyncio.sleep(min(self.retry_interval, self.check_interval) / 4)
+    def start(self) -> None:
+        self.loop_task = asyncio.create_task(self._loop())
+    async def stop(self) -> None:
+        tasks = list(self.running.values()) + ([self.loop_task] if self.loop_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    def ready(self) -> bool:
+        return all(status["status"] == "ok" for status in self.status.values() if status["required"])
+    def readiness(self) -> Dict[str, Any]:
+        return {"status": "ready" if self.ready() else "not ready", "dependencies": self.status}
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "alive", "uptime": round(time.time() - self.started_at, 3)}
+
+
+async def check_http(url: str, headers: Optional[Dict[str, str]] = None) -> None:
+    """Check that an HTTP upstream answers (and accepts our credentials) with a cheap GET request."""
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
@@ -0,0 +1,62 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from prerank import normalize_seniority
+
+
+class JobIndex:
+    """Local SQLite index of the job postings returned by the web search, deduplicated on the posting URL and searchable with FTS5."""
+    def __init__(self, db_path: str = "index/job_index.db") -> None:
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("CREATE TABLE IF NOT EXISTS jobs (job_post_url TEXT PRIMARY KEY, job_title TEXT NOT NULL, company TEXT NOT NULL, experience_level TEXT NOT NULL, required_skills TEXT NOT NULL, remote INTEGER NOT NULL, location TEXT, salary INTEGER, first_seen REAL NOT NULL, last_seen REAL NOT NULL)")
+        self.connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(job_post_url UNINDEXED, job_title, company, required_skills, location)")
+        self.connection.commit()
+    def ingest(self, jobs: List[Dict[str, Any]]) -> int:
+        """Insert new postings and refresh the ones already indexed. Returns the number of new postings."""
+        now = time.time()
+        new_postings = 0
+        with self.lock:
+            for job in jobs:
+                exists = self.connection.execute("SELECT 1 FROM jobs WHERE job_post_url = ?", (job["job_post_url"],)).fetchone() is not None
+                if exists:
+                    self.connection.execute("UPDATE jobs SET job_title = ?, company = ?, experience_level = ?, required_skills = ?, remote = ?, location = ?, salary = ?, last_seen = ? WHERE job_post_url = ?", (job["job_title"], job["company"], job["experience_level"], json.dumps(job["required_skills"]), int(job["remote"]), job["location"], job["salary"], now, job["job_post_url"]))
+                    self.connection.execute("DELETE FROM jobs_fts WHERE job_post_url = ?", (job["job_post_url"],))
+                else:
+                    self.connection.execute("INSERT INTO jobs (job_post_url, job_title, company, experience_level, required_skills, remote, location, salary, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (job["job_post_url"], job["job_title"], job["company"], job["experience_level"], json.dumps(job["required_skills"]), int(job["remote"]), job["location"], job["salary"], now, now))
+                    new_postings += 1
+                self.connection.execute("INSERT INTO jobs_fts (job_post_url, job_title, company, required_skills, location) VALUES (?, ?, ?, ?, ?)", (job["job_post_url"], job["job_title"], job["company"], " ".join(job["required_skills"]), job["location"] or ""))
+            self.connection.commit()
+        return new_postings
+    def search(self, skills: str, seniority: Optional[str] = None, remote: Optional[bool] = None, location: Optional[str] = None, max_age_days: float = 14, limit: int = 10) -> List[Dict[str, Any]]:
+        """Rank the postings seen in the last `max_age_days` days by full-text relevance to `skills`, filtered by seniority, remote flag and location."""
+        terms = re.findall(r"[\w+#.]+", skills.lower())
+        filters = ["jobs.last_seen >= ?"]
+        params: List[Any] = [time.time() - max_age_days * 24 * 3600]
+        # the agent passes the seniority as written in the resume ('Senior', 'Mid level', ...): unknown values do not filter
+        seniority = normalize_seniority(seniority)
+        if seniority is not None:
+            filters.append("jobs.experience_level = ?")
+            params.append(seniority)
+        if remote is not None:
+            filters.append("jobs.remote = ?")
+            params.append(int(remote))
+        if location is not None:
+            filters.append("(jobs.remote = 1 OR jobs.location IS NULL OR jobs.location LIKE ?)")
+            params.append(f"%{location}%")
+        if len(terms) > 0:
+            query = "SELECT jobs.* FROM jobs_fts JOIN jobs ON jobs.job_post_url = jobs_fts.job_post_url WHERE jobs_fts MATCH ? AND " + " AND ".join(filters) + " ORDER BY bm25(jobs_fts), jobs.last_seen DESC LIMIT ?"
+            params = [" OR ".join('"' + term.replace('"', '') + '"' for term in terms)] + params
+        else:
+            query = "SELECT jobs.* FROM jobs WHERE " + " AND ".join(filters) + " ORDER BY jobs.last_seen DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [{"job_title": row["job_title"], "experience_level": row["experience_level"], "required_skills": json.loads(row["required_skills"]), "remote": bool(row["remote"]), "location": row["location"], "salary": row["salary"], "job_post_url": row["job_post_url"], "company": row["company"], "first_seen": time.strftime("%Y-%m-%d", time.gmtime(row["first_seen"])), "last_seen": time.strftime("%Y-%m-%d", time.gmtime(row["last_seen"]))} for row in rows]
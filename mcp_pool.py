@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import asynccontextmanager
+from llama_index.tools.mcp import BasicMCPClient
+from mcp import types
+from mcp.shared.exceptions import McpError
+from metrics import track_stage, trace_id_var
+
+
+class MCPCallTimeout(TimeoutError):
+    """A tool call exceeded `call_timeout`: the session is still healthy, and the call is not retried."""
+
+
+class MCPConnection:
+    """A long-lived MCP session, owned by a background task so that its transport context stays open across requests."""
+    def __init__(self, client: BasicMCPClient) -> None:
+        self.client = client
+        self.session = None
+        self.task: asyncio.Task | None = None
+        self.closing = asyncio.Event()
+        self.broken = False
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with BasicMCPClient._run_session(self.client) as session:
+                ready.set_result(session)
+                await self.closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.broken = True
+    async def open(self) -> None:
+        ready = asyncio.get_running_loop().create_future()
+        self.task = asyncio.create_task(self._run(ready))
+        self.session = await ready
+    async def close(self) -> None:
+        self.closing.set()
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(self.task, timeout=5)
+            except (asyncio.TimeoutError, Exception):
+                self.task.cancel()
+
+
+class PooledMCPClient(BasicMCPClient):
+    """
+    BasicMCPClient that keeps a pool of persistent MCP sessions instead of opening a new connection for every call.
+
+    Calls are spread round-robin over the pool (an MCP session multiplexes concurrent requests). Broken sessions are replaced
+    transparently and every reconnection bumps `generation`, so callers caching the tool list know when to refresh it.
+    """
+    def __init__(self, command_or_url: str, pool_size: int = 4, call_timeout: float = 300.0, args: list[str] | None = None, env: dict[str, str] | None = None) -> None:
+        super().__init__(command_or_url, args=args or [], env=env or {})
+        self.pool_size = pool_size
+        self.call_timeout = call_timeout
+        self.generation = 0
+        self.connections: list[MCPConnection] = []
+        self.next_index = 0
+        self.lock: asyncio.Lock | None = None
+    async def _connection(self) -> MCPConnection:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            broken = [connection for connection in self.connections if connection.broken]
+            if len(broken) > 0:
+                for connection in broken:
+                    await connection.close()
+                self.connections = [connection for connection in self.connections if not connection.broken]
+                self.generation += 1
+            if len(self.connections) < self.pool_size:
+                connection = MCPConnection(self)
+                await connection.open()
+                self.connections.append(connection)
+                return connection
+            self.next_index = (self.next_index + 1) % len(self.connections)
+            return self.connections[self.next_index]
+    @asynccontextmanager
+    async def _run_session(self):
+        connection = await self._connection()
+        try:
+            yield connection.session
+        except (McpError, MCPCallTimeout):
+            raise
+        except Exception:
+            connection.broken = True
+            raise
+    async def _with_retry(self, operation, idempotent: bool = False):
+        for attempt in range(2):
+            sent = False
+            try:
+                async with self._run_session() as session:
+                    sent = True
+                    try:
+                        return await asyncio.wait_for(operation(session), timeout=self.call_timeout)
+                    except asyncio.TimeoutError as e:
+                        # only transport errors break the shared session; a slow call (e.g. many job evaluations) is not repeated
+                        raise MCPCallTimeout(f"MCP call timed out after {self.call_timeout} seconds") from e
+            except (McpError, MCPCallTimeout):
+                raise
+            except Exception:
+                # a request that may have reached the server is not repeated, unless it is idempotent (e.g. listing the tools)
+                if attempt == 1 or (sent and not idempotent):
+                    raise
+    async def call_tool(self, tool_name: str, arguments: dict):
+        # the trace id travels in the request `_meta`, so that it is not part of the tool arguments seen by the LLM
+        params = types.CallToolRequestParams(name=tool_name, arguments=arguments, _meta={"trace_id": trace_id_var.get()})
+        request = types.ClientRequest(types.CallToolRequest(method="tools/call", params=params))
+        with track_stage(f"mcp:{tool_name}"):
+            return await self._with_retry(lambda session: session.send_request(request, types.CallToolResult))
+    async def list_tools(self):
+        return await self._with_retry(lambda session: session.list_tools(), idempotent=True)
+    async def aclose(self) -> None:
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
@@ -0,0 +1,174 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import Field
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMChatStartEvent
+from llama_index.core.instrumentation.events.span import SpanDropEvent
+
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if len(names) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class CallbackCounter(Counter):
+    """Counter whose values are read from `callback` (returning {label values: value}) at every scrape."""
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...], callback: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        super().__init__(name, description, labels)
+        self.callback = callback
+    def render(self) -> List[str]:
+        self.values = dict(self.callback())
+        return super().render()
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+        self.lock = threading.Lock()
+    def observe(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            bucket_counts, total, count = self.values.get(label_values, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+            self.values[label_values] = (bucket_counts, total + value, count + 1)
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, (bucket_counts, total, count) in self.values.items():
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), label_values + (str(bound),))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), label_values + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: List[Counter | Histogram] = []
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    def render(self) -> str:
+        """Render all the metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_LATENCY = REGISTRY.register(Histogram("resume_matcher_stage_latency_seconds", "Latency of each pipeline stage", ("stage",)))
+STAGE_ERRORS = REGISTRY.register(Counter("resume_matcher_upstream_errors_total", "Errors raised by upstream services, by pipeline stage", ("stage", "error")))
+LLM_TOKENS = REGISTRY.register(Counter("resume_matcher_llm_tokens_total", "LLM tokens consumed, by model and kind (prompt/completion)", ("model", "kind")))
+
+
+def register_cache(name: str, cache) -> None:
+    """Expose the hit and miss counters of a cache (any object with `hits` and `misses` attributes)."""
+    REGISTRY.register(CallbackCounter(f"resume_matcher_{name}_cache_requests_total", f"Lookups in the {name.replace('_', ' ')} cache, by result", ("result",), lambda: {("hit",): cache.hits, ("miss",): cache.misses}))
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a pipeline stage, counting its errors, and log it with the current trace id."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage, type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage)
+        print(f"[trace_id={trace_id_var.get()}] stage={stage} duration={elapsed:.3f}s", flush=True)
+
+
+class LLMUsageHandler(BaseEventHandler):
+    """
+    Record the latency of every LLM chat call and the tokens reported by the provider (OpenAI-compatible `usage` field).
+
+    Calls that raise or are cancelled (e.g. by a timeout) get no end event: they are recorded as errors, with their latency, when
+    their span is dropped, and the calls whose end is never seen are pruned after `max_age` seconds or beyond `max_entries`.
+    """
+    started: Dict[Optional[str], Tuple[float, str]] = Field(default_factory=dict)
+    max_age: float = 900.0
+    max_entries: int = 10000
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMUsageHandler"
+    def _finish(self, span_id: Optional[str], error: Optional[str] = None) -> Optional[str]:
+        start, model = self.started.pop(span_id, (None, None))
+        if start is None:
+            return None
+        STAGE_LATENCY.observe(time.perf_counter() - start, f"llm_chat:{model}")
+        if error is not None:
+            STAGE_ERRORS.inc(f"llm_chat:{model}", error)
+        return model
+    def _prune(self) -> None:
+        now = time.perf_counter()
+        while len(self.started) > 0:
+            span_id, (start, model) = next(iter(self.started.items()))
+            if len(self.started) <= self.max_entries and now - start <= self.max_age:
+                break
+            del self.started[span_id]
+            STAGE_ERRORS.inc(f"llm_chat:{model}", "NoEndEvent")
+    def handle(self, event, **kwargs) -> None:
+        if isinstance(event, LLMChatStartEvent):
+            self.started.pop(event.span_id, None)
+            self.started[event.span_id] = (time.perf_counter(), event.model_dict.get("model", "unknown"))
+            self._prune()
+            return
+        if isinstance(event, SpanDropEvent):
+            self._finish(event.span_id, error="SpanDropped")
+            return
+        if not isinstance(event, LLMChatEndEvent):
+            return
+        model = self._finish(event.span_id) or "unknown"
+        if event.response is None:
+            return
+        raw = event.response.raw
+        usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            value = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+            if value:
+                LLM_TOKENS.inc(model, kind.removesuffix("_tokens"), amount=value)
+
+
+def install_llm_usage_handler() -> None:
+    get_dispatcher().add_event_handler(LLMUsageHandler())
@@ -0,0 +1,91 @@
+import re
+import zlib
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+SENIORITY_LEVELS = ["internship", "entry level", "junior", "mid-level", "senior"]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9+#]+", text.lower())
+
+
+def normalize_seniority(seniority: Optional[str]) -> Optional[str]:
+    """Map a free-text seniority ('Senior', 'Mid level', 'Junior Developer', ...) to one of SENIORITY_LEVELS, or None if there is none."""
+    if seniority is None:
+        return None
+    normalized = seniority.lower().replace("-", " ")
+    for level in reversed(SENIORITY_LEVELS):
+        if level.replace("-", " ") in normalized:
+            return level
+    return None
+
+
+def parse_candidate_profile(candidate_profile: str) -> Dict[str, Optional[str]]:
+    """Extract the fields written by the resume parser ('Skills: ...', 'Seniority: ...', ...) from a candidate profile string."""
+    fields = {"potential_job_roles": r"Potential Job Roles:", "seniority": r"Seniority:", "skills": r"Skills:", "based_in": r"Based in:", "work_location": r"Working location:"}
+    parsed = {}
+    for name, label in fields.items():
+        match = re.search(label + r"\s*(.*)", candidate_profile, flags=re.IGNORECASE)
+        value = match.group(1).strip() if match is not None else None
+        parsed[name] = None if value in (None, "", "Information not available") else value
+    return parsed
+
+
+class PreRanker:
+    """
+    Cheap local ranking of job postings against a candidate profile, used to decide which jobs deserve an LLM evaluation.
+
+    The pre-score (0-100) combines the cosine similarity of hashed bag-of-words vectors of skills and job titles, the distance between
+    the required and the candidate's seniority, and the compatibility between the job's remote/location setting and the candidate's.
+    Seniority and location only count for jobs whose skill similarity reaches `min_skill_similarity`, so that a job with no skill
+    overlap can never reach the threshold on seniority and location alone.
+    """
+    def __init__(self, top_k: int = 5, threshold: float = 30.0, dimensions: int = 1024, weights: tuple[float, float, float] = (0.6, 0.25, 0.15), min_skill_similarity: float = 0.1) -> None:
+        self.top_k = top_k
+        self.threshold = threshold
+        self.min_skill_similarity = min_skill_similarity
+        self.dimensions = dimensions
+        self.weights = np.array(weights)
+    def _vectorize(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(self.dimensions)
+        for token in tokens:
+            vector[zlib.crc32(token.encode()) % self.dimensions] += 1.0
+        return vector
+    def _seniority(self, seniority: Optional[str]) -> Optional[int]:
+        level = normalize_seniority(seniority)
+        return SENIORITY_LEVELS.index(level) if level is not None else None
+    def _location(self, profile: Dict[str, Optional[str]], job: Dict[str, Any]) -> float:
+        work_location = (profile["work_location"] or "").lower()
+        if job.get("remote"):
+            return 1.0 if "remote" in work_location or work_location == "" else 0.6
+        if work_location != "" and "hybrid" not in work_location and "site" not in work_location:
+            return 0.0
+        if job.get("location") is None or profile["based_in"] is None:
+            return 0.5
+        return 1.0 if len(set(tokenize(job["location"])) & set(tokenize(profile["based_in"]))) > 0 else 0.2
+    def pre_score(self, candidate_profile: str, jobs: List[Dict[str, Any]]) -> np.ndarray:
+        if len(jobs) == 0:
+            return np.zeros(0)
+        profile = parse_candidate_profile(candidate_profile)
+        if profile["skills"] is None and profile["potential_job_roles"] is None:
+            candidate_tokens = tokenize(candidate_profile)
+        else:
+            candidate_tokens = tokenize(" ".join([profile["skills"] or "", profile["potential_job_roles"] or ""]))
+        candidate_vector = self._vectorize(candidate_tokens)
+        job_matrix = np.stack([self._vectorize(tokenize(" ".join(job.get("required_skills", []) + [job.get("job_title", "")]))) for job in jobs])
+        norms = np.linalg.norm(job_matrix, axis=1) * np.linalg.norm(candidate_vector)
+        skill_similarity = np.divide(job_matrix @ candidate_vector, norms, out=np.zeros(len(jobs)), where=norms > 0)
+        candidate_level = self._seniority(profile["seniority"])
+        job_levels = np.array([SENIORITY_LEVELS.index(job["experience_level"]) if job.get("experience_level") in SENIORITY_LEVELS else -1 for job in jobs])
+        if candidate_level is None:
+            seniority_similarity = np.full(len(jobs), 0.5)
+        else:
+            seniority_similarity = np.where(job_levels >= 0, 1.0 - np.abs(job_levels - candidate_level) / (len(SENIORITY_LEVELS) - 1), 0.5)
+        location_similarity = np.array([self._location(profile, job) for job in jobs])
+        skills_match = skill_similarity >= self.min_skill_similarity
+        return 100 * np.stack([skill_similarity, seniority_similarity * skills_match, location_similarity * skills_match], axis=1) @ self.weights
+    def select(self, scores: np.ndarray) -> List[int]:
+        """Indices (in the original order) of the top_k jobs whose pre-score reaches the threshold."""
+        ranked = [int(index) for index in np.argsort(-scores, kind="stable") if scores[index] >= self.threshold][:self.top_k]
+        return sorted(ranked)
@@ -0,0 +1,39 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+from llama_index.core.llms import ChatMessage
+from metrics import track_stage
+
+
+class JobScorer:
+    def __init__(self, llm_struct, max_concurrency: int = 5, timeout: float = 60.0, max_retries: int = 2, backoff: float = 1.0) -> None:
+        self.llm_struct = llm_struct
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore: asyncio.Semaphore | None = None
+    async def _score_job(self, base_messages: List[ChatMessage], job: Dict[str, Any]) -> Dict[str, Any]:
+        messages = base_messages.copy()
+        messages.append(ChatMessage.from_str(role="user", content=f"And here is the JSON card of a job that I found:\n\n'''\n{json.dumps(job)}\n'''\n\nCan you evaluate the match for me?"))
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                async with self.semaphore:
+                    with track_stage("job_evaluation"):
+                        response = await asyncio.wait_for(self.llm_struct.achat(messages), timeout=self.timeout)
+                json_response = json.loads(response.message.blocks[0].text)
+                return {"score": json_response['match_score'], "reasons": json_response['reasons']}
+            except asyncio.TimeoutError:
+                last_error = f"Evaluation timed out after {self.timeout} seconds"
+            except Exception as e:
+                last_error = f"{type(e).__name__}: {e}"
+        return {"score": None, "error": f"Evaluation failed after {self.max_retries + 1} attempts ({last_error})"}
+    async def score_jobs(self, base_messages: List[ChatMessage], jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score all jobs concurrently, returning one result per job in the original order."""
+        # shared by all the calls, so that max_concurrency bounds the evaluations of the whole server
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*[self._score_job(base_messages, job) for job in jobs])
@@ -1,4 +1,4 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 import datetime
 from pydantic import BaseModel, Field
 from typing import List
@@ -6,8 +6,20 @@ from llama_index.core.llms import ChatMessage
 import json
 from llama_index.llms.groq import Groq
 import argparse
+import uvicorn
 from typing import Literal
 from linkup import LinkupClient
+from scoring import JobScorer
+from prerank import PreRanker
+from cache import SearchCache, InMemoryBackend, RedisBackend, ResultStore
+from job_index import JobIndex
+from metrics import REGISTRY, install_llm_usage_handler, register_cache, track_stage, trace_id_var
+from health import HealthChecks, check_http
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
+import os
 
 class JobDescription(BaseModel):
     job_title: str = Field(description="Job Title sponsored in the job announcement")
@@ -26,36 +38,114 @@ class JobMatchEvaluation(BaseModel):
     match_score: int = Field(description="An evaluation, between 0 and 100, of how much the job details match the resume data from the candidate")
     reasons: str = Field(description="Reasons for the evaluation")
 
-with open("/run/secrets/linkup_key") as f:
+secrets_dir = os.environ.get("SECRETS_DIR", "/run/secrets")
+
+with open(f"{secrets_dir}/linkup_key") as f:
     linkup_api_key = f.read()
 f.close()
 
-with open("/run/secrets/groq_key") as g:
+with open(f"{secrets_dir}/groq_key") as g:
     groq_api_key = g.read()
 g.close()
 
 mcp = FastMCP(name = "Resume Matcher MCP")
-linkup_client = LinkupClient(api_key=linkup_api_key)
-llm = Groq(model="qwen-qwq-32b", api_key=groq_api_key)
-llm_struct = llm.as_structured_llm(JobMatchEvaluation)
+groq_api_base = os.environ.get("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+linkup_client: LinkupClient | None = None
+scorer = JobScorer(llm_struct=None)
+prerank = PreRanker()
+search_cache = SearchCache(InMemoryBackend())
+result_store = ResultStore(InMemoryBackend(max_entries=512))
+job_index = JobIndex()
+install_llm_usage_handler()
+register_cache("job_search", search_cache)
+
+health = HealthChecks()
+health.register("job_index", lambda: asyncio.to_thread(job_index.search, "", limit=1))
+health.register("search_cache", lambda: search_cache.backend.get(search_cache.key_for("health check")))
+health.register("groq", lambda: check_http(f"{groq_api_base}/models", {"Authorization": f"Bearer {groq_api_key}"}), required=False)
+
+def get_linkup_client() -> LinkupClient:
+    global linkup_client
+    if linkup_client is None:
+        linkup_client = LinkupClient(api_key=linkup_api_key, base_url=os.environ.get("LINKUP_BASE_URL", "https://api.linkup.so/v1"))
+    return linkup_client
+
+def get_scorer() -> JobScorer:
+    if scorer.llm_struct is None:
+        scorer.llm_struct = Groq(model="qwen-qwq-32b", api_key=groq_api_key, api_base=groq_api_base).as_structured_llm(JobMatchEvaluation)
+    return scorer
+
+@asynccontextmanager
+async def lifespan(_):
+    health.start()
+    yield
+    await health.stop()
+
+async def liveness(request: Request) -> JSONResponse:
+    return JSONResponse(health.liveness())
+
+async def readiness(request: Request) -> JSONResponse:
+    report = health.readiness()
+    return JSONResponse(report, status_code=200 if health.ready() else 503)
+
+def bind_trace_id(ctx: Context) -> None:
+    meta = ctx.request_context.meta
+    trace_id_var.set(getattr(meta, "trace_id", None) if meta is not None else None)
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-@mcp.tool(name="job_searcher", description="Search for a job with a given job description based on the candidate Resume. Requires: job_description (str) - the description of the job that would perfectly fit the candidate.")
-def job_searcher(job_description: str):
-    search_outcome = linkup_client.search(query=job_description, depth="standard", output_type="structured", include_images=False, structured_output_schema=JobAnnouncements)
+async def linkup_search(job_description: str) -> str:
+    with track_stage("linkup_search"):
+        search_outcome = await get_linkup_client().async_search(query=job_description, depth="standard", output_type="structured", include_images=False, structured_output_schema=JobAnnouncements)
+    await asyncio.to_thread(job_index.ingest, [job.model_dump() for job in search_outcome.jobs])
     return search_outcome.model_dump_json(indent=4)
+
+async def store_jobs(jobs: str) -> str:
+    jobs_list = json.loads(jobs)["jobs"]
+    result_id = await result_store.put(jobs)
+    summary = [f"{job['job_title']} at {job['company']} ({job['experience_level']}, {'remote' if job['remote'] else job['location'] or 'on-site'})" for job in jobs_list]
+    return json.dumps({"result_id": result_id, "total_jobs": len(jobs_list), "jobs": summary})
+
+async def load_jobs(jobs: str) -> dict:
+    # either a result id or the inline JSON of the jobs
+    if jobs.lstrip().startswith("{"):
+        jobs_list = json.loads(jobs)
+        if "result_id" not in jobs_list:
+            return jobs_list
+        jobs = jobs_list["result_id"]
+    stored = await result_store.get(jobs)
+    if stored is None:
+        raise ValueError(f"Unknown or expired result id '{jobs}': search for the jobs again and pass the new result_id")
+    return json.loads(stored)
+
+@mcp.tool(name="job_searcher", description="Search for a job with a given job description based on the candidate Resume. Requires: job_description (str) - the description of the job that would perfectly fit the candidate. Returns a result_id, to be passed as it is to 'evaluate_job_match', and a short summary of the jobs found.")
+async def job_searcher(job_description: str, ctx: Context):
+    bind_trace_id(ctx)
+    return await store_jobs(await search_cache.get_or_search(job_description, linkup_search))
+
+@mcp.tool(name="job_index_search", description="Search the local index of job postings found by previous web searches. It is much faster than 'job_searcher', but only knows postings seen in the last days. Requires: skills (str) - the candidate's skills and potential job titles. Optional: seniority (str) - one of 'internship', 'entry level', 'junior', 'mid-level', 'senior'; remote (bool) - whether the job must (true) or must not (false) be remote; location (str) - where the candidate is based; limit (int) - maximum number of jobs to return (default 10). Returns a result_id and a summary of the jobs, in the same format as 'job_searcher'.")
+async def job_index_search(ctx: Context, skills: str, seniority: str | None = None, remote: bool | None = None, location: str | None = None, limit: int | None = None):
+    bind_trace_id(ctx)
+    jobs = await asyncio.to_thread(job_index.search, skills, seniority, remote, location, limit=limit or 10)
+    return await store_jobs(json.dumps({"jobs": jobs}))
     
-@mcp.tool(name="evaluate_job_match", description = "Evaluates the match between jobs opening and the candidate's profile. Requires as input: candidate_profile (str): the input data coming from the candidate's resume; jobs (str): a JSON-like string of the job openings, retrieved from a job search with the 'job_searcher' tool")
-def evaluate_job_match(candidate_profile: str, jobs: str):
-    jobs_list = json.loads(jobs)
+@mcp.tool(name="evaluate_job_match", description = "Evaluates the match between jobs opening and the candidate's profile. Requires as input: candidate_profile (str): the input data coming from the candidate's resume; jobs (str): the result_id returned by the 'job_searcher' or 'job_index_search' tool (a JSON-like string of the job openings is also accepted)")
+async def evaluate_job_match(candidate_profile: str, jobs: str, ctx: Context):
+    bind_trace_id(ctx)
+    jobs_list = await load_jobs(jobs)
     base_messages = [ChatMessage.from_str(role="system", content="You are a job matching assistant. Your task is to evaluate a job based on its match with the candidate's profile, taking into account the job title, the skills required, the seniority level, the physical location (where the company offering the work is based in) and the working location (remote/hybrid/on-site). You then have to produce a match score (between 0 and 100) and justify that match scores explaining your reasons for that."), ChatMessage.from_str(role="user", content=f"Here is my profile:\n\n'''\n{candidate_profile}\n'''")]
+    pre_scores = prerank.pre_score(candidate_profile, jobs_list['jobs'])
+    selected = prerank.select(pre_scores)
+    evaluations = dict(zip(selected, await get_scorer().score_jobs(base_messages, [jobs_list['jobs'][index] for index in selected])))
     matches = {}
-    for job in jobs_list['jobs']:
-        messages = base_messages.copy()
-        messages.append(ChatMessage.from_str(role="user", content=f"And here is the JSON card of a job that I found:\n\n'''\n{json.dumps(job)}\n'''\n\nCan you evaluate the match for me?"))
-        response = llm_struct.chat(messages)
-        json_response = json.loads(response.message.blocks[0].text)
-        matches.update({f"{job['job_title']} at {job['company']} ({job['job_post_url']})": {"score": json_response['match_score'], "reasons": json_response['reasons']}})
-        print({f"{job['job_title']} at {job['company']} ({job['job_post_url']})": {"score": json_response['match_score'], "reasons": json_response['reasons']}}, flush = True)
+    for index, job in enumerate(jobs_list['jobs']):
+        if index in evaluations:
+            evaluation = {**evaluations[index], "pre_score": round(float(pre_scores[index]), 1)}
+        else:
+            evaluation = {"score": None, "pre_score": round(float(pre_scores[index]), 1), "reasons": "Not evaluated by the LLM: the local pre-ranking score (skills, seniority and location overlap) is below the cutoff"}
+        matches.update({f"{job['job_title']} at {job['company']} ({job['job_post_url']})": evaluation})
+        print({f"{job['job_title']} at {job['company']} ({job['job_post_url']})": evaluation}, flush = True)
     return json.dumps(matches)
 
 if __name__ == "__main__":
@@ -63,5 +153,54 @@ if __name__ == "__main__":
     parser.add_argument(
         "--server_type", type=str, default="sse", choices=["sse", "stdio"]
     )
+    parser.add_argument(
+        "--max_concurrency", type=int, default=5, help="Maximum number of job evaluations running in parallel, across all the requests"
+    )
+    parser.add_argument(
+        "--llm_timeout", type=float, default=60.0, help="Timeout (in seconds) for each job evaluation call"
+    )
+    parser.add_argument(
+        "--max_retries", type=int, default=2, help="Number of retries for a failed job evaluation"
+    )
+    parser.add_argument(
+        "--prerank_top_k", type=int, default=5, help="Maximum number of jobs (the best pre-ranked ones) sent to the LLM for evaluation"
+    )
+    parser.add_argument(
+        "--prerank_threshold", type=float, default=30.0, help="Minimum pre-ranking score (0-100) for a job to be sent to the LLM for evaluation"
+    )
+    parser.add_argument(
+        "--prerank_min_skill_similarity", type=float, default=0.1, help="Minimum skill similarity (0-1) for the seniority and location of a job to count in its pre-ranking score"
+    )
+    parser.add_argument(
+        "--search_cache_backend", type=str, default="memory", choices=["memory", "redis"], help="Where to cache job search results"
+    )
+    parser.add_argument(
+        "--search_cache_ttl", type=float, default=6 * 3600, help="Time (in seconds) a cached job search result stays valid"
+    )
+    parser.add_argument(
+        "--result_store_ttl", type=float, default=3600, help="Time (in seconds) a job search result stays available to 'evaluate_job_match' through its result id"
+    )
+    parser.add_argument(
+        "--redis_url", type=str, default="redis://resume_matcher_redis:6379", help="Redis instance used by the 'redis' search cache backend"
+    )
     args = parser.parse_args()
-    mcp.run(args.server_type)
\ No newline at end of file
+    scorer.max_concurrency = args.max_concurrency
+    scorer.timeout = args.llm_timeout
+    scorer.max_retries = args.max_retries
+    prerank.top_k = args.prerank_top_k
+    prerank.threshold = args.prerank_threshold
+    prerank.min_skill_similarity = args.prerank_min_skill_similarity
+    if args.search_cache_backend == "redis":
+        search_cache.backend = RedisBackend(args.redis_url)
+        result_store.backend = search_cache.backend
+    search_cache.ttl = args.search_cache_ttl
+    result_store.ttl = args.result_store_ttl
+    if args.server_type == "sse":
+        starlette_app = mcp.sse_app()
+        starlette_app.add_route("/metrics", metrics_endpoint)
+        starlette_app.add_route("/health/live", liveness)
+        starlette_app.add_route("/health/ready", readiness)
+        starlette_app.router.lifespan_context = lifespan
+        uvicorn.run(starlette_app, host=mcp.settings.host, port=mcp.settings.port, log_level=mcp.settings.log_level.lower())
+    else:
+        mcp.run(args.server_type)
\ No newline at end of file
@@ -1,17 +1,140 @@
 from llama_index.core.llms import ChatMessage
+from collections import OrderedDict
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+from redis.exceptions import NoScriptError, RedisError
+from starlette.requests import Request
+from starlette.responses import Response
 from typing import List
+import asyncio
+import json
+import time
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough to enforce a history budget."""
+    return len(text) // 4 + 1
 
 
 class ChatHistory:
-    def __init__(self) -> None:
+    def __init__(self, max_tokens: int = 4000) -> None:
         self.message_history: List[ChatMessage] = []
+        self.max_tokens = max_tokens
+        self.last_access = time.time()
     def add_to_history(self, content: str, role: str) -> None:
         history_piece = ChatMessage.from_str(content=content, role=role)
         self.message_history.append(history_piece)
+        self.last_access = time.time()
+        while len(self.message_history) > 1 and sum(count_tokens(message.content or "") for message in self.message_history) > self.max_tokens:
+            self.message_history.pop(0)
     def get_history(self):
-        return self.message_history
-    
+        self.last_access = time.time()
+        return list(self.message_history)
+
+
+class SessionHistoryStore:
+    """In-process chat histories, one per session, each bounded by a token budget and evicted after `idle_timeout` seconds of inactivity."""
+    def __init__(self, max_tokens: int = 4000, idle_timeout: float = 3600, max_sessions: int = 10000) -> None:
+        self.max_tokens = max_tokens
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions: OrderedDict[str, ChatHistory] = OrderedDict()
+    def _evict(self) -> None:
+        now = time.time()
+        while len(self.sessions) > 0:
+            session_id, history = next(iter(self.sessions.items()))
+            if now - history.last_access > self.idle_timeout or len(self.sessions) > self.max_sessions:
+                del self.sessions[session_id]
+            else:
+                break
+    def _session(self, session_id: str) -> ChatHistory:
+        self._evict()
+        if session_id not in self.sessions:
+            self.sessions[session_id] = ChatHistory(max_tokens=self.max_tokens)
+        self.sessions.move_to_end(session_id)
+        return self.sessions[session_id]
+    async def get_history(self, session_id: str) -> List[ChatMessage]:
+        return self._session(session_id).get_history()
+    async def add_to_history(self, session_id: str, content: str, role: str) -> None:
+        self._session(session_id).add_to_history(content, role)
+
+
+class RedisSessionHistoryStore:
+    """Chat histories stored in Redis, so that several app replicas share them. Idle sessions expire through the key TTL."""
+    def __init__(self, redis_connection, max_tokens: int = 4000, idle_timeout: float = 3600, prefix: str = "chat_history") -> None:
+        self.redis = redis_connection
+        self.max_tokens = max_tokens
+        self.idle_timeout = idle_timeout
+        self.prefix = prefix
+    async def get_history(self, session_id: str) -> List[ChatMessage]:
+        key = f"{self.prefix}:{session_id}"
+        raw_messages = await self.redis.lrange(key, 0, -1)
+        await self.redis.expire(key, int(self.idle_timeout))
+        return [ChatMessage.from_str(**json.loads(raw_message)) for raw_message in raw_messages]
+    async def add_to_history(self, session_id: str, content: str, role: str) -> None:
+        key = f"{self.prefix}:{session_id}"
+        await self.redis.rpush(key, json.dumps({"content": content, "role": role}))
+        raw_messages = await self.redis.lrange(key, 0, -1)
+        tokens = [count_tokens(json.loads(raw_message)["content"]) for raw_message in raw_messages]
+        start = 0
+        while start < len(tokens) - 1 and sum(tokens[start:]) > self.max_tokens:
+            start += 1
+        if start > 0:
+            await self.redis.ltrim(key, start, -1)
+        await self.redis.expire(key, int(self.idle_timeout))
+
+
+limiter_init_attempt = 0.0
+
+async def init_rate_limiter(redis_connection, retry_interval: float = 5.0, timeout: float = 2.0) -> bool:
+    """Initialize FastAPILimiter if Redis was not available yet (at most once every `retry_interval` seconds). Returns whether rate limiting is available."""
+    global limiter_init_attempt
+    if FastAPILimiter.redis is not None and FastAPILimiter.lua_sha is not None:
+        return True
+    if time.time() - limiter_init_attempt < retry_interval:
+        return False
+    limiter_init_attempt = time.time()
+    try:
+        await asyncio.wait_for(FastAPILimiter.init(redis_connection), timeout=timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as e:
+        print(f"Rate limiting is disabled until Redis is available: {type(e).__name__}: {e}", flush=True)
+        FastAPILimiter.lua_sha = None
+        return False
+    return True
 
 
+class SafeRateLimiter(RateLimiter):
+    """RateLimiter that initializes FastAPILimiter on first use and lets requests through while Redis is unavailable."""
+    def __init__(self, redis_connection, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.redis_connection = redis_connection
+    async def __call__(self, request: Request, response: Response):
+        if not await init_rate_limiter(self.redis_connection):
+            return
+        try:
+            return await super().__call__(request, response)
+        except (RedisError, OSError) as e:
+            print(f"Request not rate limited, Redis is unavailable: {type(e).__name__}: {e}", flush=True)
 
 
+class UserRateLimiter:
+    """Fixed-window rate limiter keyed by username, sharing the Redis connection and Lua script of FastAPILimiter."""
+    def __init__(self, times: int, seconds: int, prefix: str = "gradio", redis_connection = None) -> None:
+        self.times = times
+        self.milliseconds = seconds * 1000
+        self.prefix = prefix
+        self.redis_connection = redis_connection
+    async def check(self, username: str) -> int:
+        """Register a hit for `username` and return the milliseconds to wait before retrying (0 if the request is allowed, or if Redis is unavailable)."""
+        if not await init_rate_limiter(self.redis_connection):
+            return 0
+        key = f"{FastAPILimiter.prefix}:{self.prefix}:{username}"
+        try:
+            try:
+                return await FastAPILimiter.redis.evalsha(FastAPILimiter.lua_sha, 1, key, str(self.times), str(self.milliseconds))
+            except NoScriptError:
+                FastAPILimiter.lua_sha = await FastAPILimiter.redis.script_load(FastAPILimiter.lua_script)
+                return await FastAPILimiter.redis.evalsha(FastAPILimiter.lua_sha, 1, key, str(self.times), str(self.milliseconds))
+        except (RedisError, OSError) as e:
+            print(f"User {username} not rate limited, Redis is unavailable: {type(e).__name__}: {e}", flush=True)
+            return 0